@@ -0,0 +1,135 @@
+# backpressure.py - Adaptive concurrency control for the external flight/weather APIs
+import asyncio
+import time
+from collections import deque
+
+
+def parse_retry_after(headers):
+    """Seconds from a numeric Retry-After header, or None"""
+    if headers is None:
+        return None
+    value = headers.get("Retry-After", "")
+    return float(value) if value.isdigit() else None
+
+
+class BackpressureController:
+    """AIMD concurrency limiter with a circuit breaker for a single API provider.
+
+    Concurrency grows additively while responses stay healthy and shrinks
+    multiplicatively on 429/5xx/timeouts or when the latency window runs slow.
+    Repeated 429s (or an exhausted rate-limit quota) open the breaker and pause
+    all calls to the provider for a cooldown. With window_limit set, at most
+    that many requests start within any rate_window seconds.
+    """
+
+    def __init__(self, name, c_min=1, c_max=32, c_init=4, alpha=0.5, beta=0.5,
+                 target_latency=1.5, window=32, breaker_threshold=3, cooldown=30.0,
+                 rate_window=60.0, window_limit=None):
+        self.name = name
+        self.c_min = c_min
+        self.c_max = c_max
+        self.alpha = alpha
+        self.beta = beta
+        self.target_latency = target_latency
+        self.breaker_threshold = breaker_threshold
+        self.cooldown = cooldown
+        self.rate_window = rate_window
+        self.window_limit = window_limit
+
+        self.c = float(c_init)
+        self._limit = int(c_init)  # Tokens currently backing the semaphore
+        self._debt = 0  # Tokens to swallow on release after a shrink
+        self._semaphore = asyncio.Semaphore(self._limit)
+
+        self.samples = deque(maxlen=window)
+        self.consecutive_429 = 0
+        self.open_until = 0.0
+        self.remaining = None
+        self.sent = deque()  # Sliding window of request timestamps
+
+    async def __aenter__(self):
+        while True:
+            delay = self.open_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._semaphore.acquire()
+            now = time.monotonic()
+            # The breaker may have tripped while this caller was queued on the semaphore
+            if self.open_until > now:
+                self._release()
+                continue
+            window_wait = self._window_wait(now)
+            if window_wait <= 0:
+                break
+            self._release()
+            await asyncio.sleep(window_wait)
+        self.sent.append(now)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._release()
+
+    def _release(self):
+        if self._debt:
+            self._debt -= 1
+        else:
+            self._semaphore.release()
+
+    def requests_in_window(self, now=None):
+        """Number of requests sent to this provider within the sliding rate window"""
+        cutoff = (time.monotonic() if now is None else now) - self.rate_window
+        while self.sent and self.sent[0] < cutoff:
+            self.sent.popleft()
+        return len(self.sent)
+
+    def _window_wait(self, now):
+        """Seconds until the sliding window has room; also prunes it on every send"""
+        sent = self.requests_in_window(now)
+        if self.window_limit is None or sent < self.window_limit:
+            return 0
+        return self.sent[0] + self.rate_window - now
+
+    def record(self, latency, status, headers=None):
+        """Feed one response (status None for timeouts/connection errors) into the controller"""
+        error = status is None or status == 429 or status >= 500
+        self.samples.append(latency)
+        slow = sum(self.samples) / len(self.samples) > self.target_latency
+
+        if error or slow:
+            self._resize(max(self.c_min, self.c * self.beta))
+        else:
+            self._resize(min(self.c_max, self.c + self.alpha))
+
+        retry_after = parse_retry_after(headers)
+        # Quota as reported by this response only; absent header means unknown
+        remaining = headers.get("x-ratelimit-remaining", "") if headers is not None else ""
+        self.remaining = int(remaining) if remaining.isdigit() else None
+
+        if status == 429:
+            self.consecutive_429 += 1
+            if self.consecutive_429 >= self.breaker_threshold:
+                self._trip(max(self.cooldown, retry_after or 0))
+            elif retry_after:
+                self._trip(retry_after)
+        else:
+            self.consecutive_429 = 0
+            if self.remaining == 0:
+                self._trip(retry_after or self.cooldown)
+
+    def _trip(self, seconds):
+        self.open_until = max(self.open_until, time.monotonic() + seconds)
+        print(f"{self.name}: pausing requests for {seconds:.0f}s "
+              f"({self.requests_in_window()} sent in the last {self.rate_window:.0f}s)")
+
+    def _resize(self, new_c):
+        self.c = new_c
+        target = max(1, int(new_c))
+        delta = target - self._limit
+        if delta > 0:
+            paid = min(self._debt, delta)
+            self._debt -= paid
+            for _ in range(delta - paid):
+                self._semaphore.release()
+        elif delta < 0:
+            self._debt -= delta
+        self._limit = target
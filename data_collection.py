@@ -1,135 +1,300 @@
-import requests
-import pandas as pd
-from datetime import datetime, timedelta
+import asyncio
+import aiohttp
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+import random
 import time
+from aiolimiter import AsyncLimiter
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
 from airports import INDIAN_AIRPORTS
+from backpressure import BackpressureController, parse_retry_after
+from weather_cache import WeatherCache
+
+FLIGHT_SCHEMA = pa.schema([
+    ("flight_number", pa.string()),
+    ("airline", pa.string()),
+    ("origin", pa.string()),
+    ("destination", pa.string()),
+    # Raw epoch seconds; converted to datetimes in bulk at training time
+    ("scheduled_departure_ts", pa.int64()),
+    ("actual_departure_ts", pa.int64()),
+    ("scheduled_arrival_ts", pa.int64()),
+    ("actual_arrival_ts", pa.int64()),
+    ("delay_minutes", pa.float64()),
+    ("aircraft", pa.string()),
+    ("route_weather", pa.string()),
+    ("route_weather_desc", pa.string()),
+    ("route_temp", pa.float64()),
+    ("route_wind", pa.float64()),
+])
 
 
 class FlightDataCollector:
-    def __init__(self, flightaware_key, weather_key):
+    _BOARDS_PARAMS = {"howMany": 10}
+    # Connect/read timeouts so a hung provider can't stall the pipeline
+    _TIMEOUT = aiohttp.ClientTimeout(sock_connect=3, sock_read=10)
+
+    def __init__(self, flightaware_key, weather_key, concurrency=20, rps=10,
+                 weather_cache_path="weather_cache.sqlite", details_cache_size=4096):
         self.flightaware_base = "https://flightxml.flightaware.com/json/FlightXML3/"
         self.flightaware_headers = {"x-apikey": flightaware_key}
         self.weather_api = weather_key
-        self.weather_cache = {}
+        self.weather_cache_path = weather_cache_path
+        self.concurrency = concurrency
+        self.rps = rps
+        self.details_cache_size = details_cache_size
+        # Created per collection run, inside the running event loop
+        self.flightaware_session = None
+        self.weather_session = None
+        self.semaphore = None
+        self.limiter = None
+        self.flightaware_bp = None
+        self.weather_bp = None
+        self.weather_cache = None
+        self.weather_tasks = None
+        self.details_cache = None
+
+    def _new_session(self, headers=None):
+        """Session with a pooled keep-alive connector so TCP+TLS handshakes are reused"""
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency,
+                                         ttl_dns_cache=300)
+        return aiohttp.ClientSession(connector=connector, headers=headers, timeout=self._TIMEOUT)
 
-    def get_route_weather(self, origin, destination, flight_time):
+    @staticmethod
+    def _backoff(attempt, retry_after=None, base=0.5):
+        """Delay before the next attempt: Retry-After if given, else jittered exponential backoff"""
+        if retry_after is not None:
+            return retry_after
+        delay = base * 2 ** (attempt - 1)
+        return delay + random.uniform(0, delay)
+
+    async def _get_json(self, session, url, controller, params=None, attempts=3):
+        """Issue a GET bounded by the provider's backpressure controller, the global
+        concurrency cap and the rate limiter, retrying on 429/5xx/timeouts"""
+        for attempt in range(1, attempts + 1):
+            retry_after = None
+            async with controller, self.semaphore, self.limiter:
+                start = time.monotonic()
+                try:
+                    async with session.get(url, params=params) as response:
+                        # Read the body before recording so a read timeout is recorded once, below
+                        body = await response.read() if response.status < 400 else None
+                        controller.record(time.monotonic() - start, response.status, response.headers)
+                        if (response.status == 429 or response.status >= 500) and attempt < attempts:
+                            retry_after = parse_retry_after(response.headers)
+                        else:
+                            response.raise_for_status()
+                            return orjson.loads(body)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    controller.record(time.monotonic() - start, None)
+                    if attempt == attempts:
+                        raise
+            # Back off without holding any concurrency slot
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    async def get_route_weather(self, origin, destination, flight_time):
         """Get historical weather along route using OpenWeatherMap API"""
-        cache_key = f"{origin}-{destination}-{flight_time.date()}"
-        if cache_key in self.weather_cache:
-            return self.weather_cache[cache_key]
+        cache_key = f"{origin}-{destination}-{flight_time:%Y-%m-%d %H}"
+        cached = self.weather_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Flights sharing a route and hour often arrive together; share one request
+        task = self.weather_tasks.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_route_weather(origin, destination, flight_time, cache_key))
+            self.weather_tasks[cache_key] = task
 
+        weather_data = await asyncio.shield(task)
+        if self.weather_tasks.get(cache_key) is task:
+            # Successes are in the disk cache now; failures may be retried
+            del self.weather_tasks[cache_key]
+        return weather_data
+
+    async def _fetch_route_weather(self, origin, destination, flight_time, cache_key):
         try:
             # Get midpoint weather (simplified - in reality would need proper routing)
-            response = requests.get(
+            lat, lon = self._get_midpoint(origin, destination)
+            weather_data = await self._get_json(
+                self.weather_session,
                 "https://api.openweathermap.org/data/3.0/onecall/timemachine",
+                self.weather_bp,
                 params={
-                    "lat": self._get_midpoint(origin, destination)['lat'],
-                    "lon": self._get_midpoint(origin, destination)['lon'],
+                    "lat": lat,
+                    "lon": lon,
                     "dt": int(flight_time.timestamp()),
                     "appid": self.weather_api,
                     "units": "metric"
                 }
             )
-            weather_data = response.json()
-            self.weather_cache[cache_key] = weather_data
+            self.weather_cache.set(cache_key, weather_data)
             return weather_data
         except Exception as e:
             print(f"Weather API error: {e}")
             return None
 
-    def _get_midpoint(self, origin_icao, dest_icao):
-        """Calculate approximate midpoint between airports"""
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _get_midpoint(origin_icao, dest_icao):
+        """Calculate approximate (lat, lon) midpoint between airports, memoized per route"""
         origin = INDIAN_AIRPORTS.get(origin_icao, {})
         dest = INDIAN_AIRPORTS.get(dest_icao, {})
 
         # Simple midpoint calculation (for demo - real routing would use Great Circle)
-        return {
-            'lat': (origin.get('lat', 0) + dest.get('lat', 0)) / 2,
-            'lon': (origin.get('lon', 0) + dest.get('lon', 0)) / 2
-        }
+        return (
+            (origin.get('lat', 0) + dest.get('lat', 0)) / 2,
+            (origin.get('lon', 0) + dest.get('lon', 0)) / 2
+        )
+
+    async def get_flight_details(self, flight_id):
+        """Get detailed flight trajectory and timing, sharing one request per ident.
 
-    def get_flight_details(self, flight_id):
-        """Get detailed flight trajectory and timing"""
+        The same ident can appear on several airports' boards (code-shares,
+        diversions), so lookups are deduplicated through an LRU of tasks.
+        """
+        task = self.details_cache.get(flight_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_flight_details(flight_id))
+            self.details_cache[flight_id] = task
+            if len(self.details_cache) > self.details_cache_size:
+                self.details_cache.popitem(last=False)
+        else:
+            self.details_cache.move_to_end(flight_id)
+
+        details = await asyncio.shield(task)
+        if details is None and self.details_cache.get(flight_id) is task:
+            # Don't cache failures, a later board may retry the ident
+            del self.details_cache[flight_id]
+        return details
+
+    async def _fetch_flight_details(self, flight_id):
         try:
-            response = requests.get(
+            data = await self._get_json(
+                self.flightaware_session,
                 f"{self.flightaware_base}FlightInfoStatus",
-                params={"ident": flight_id, "include_ex_data": 1},
-                headers=self.flightaware_headers
+                self.flightaware_bp,
+                params={"ident": flight_id, "include_ex_data": 1}
             )
-            return response.json().get("FlightInfoStatusResult", {})
+            return data.get("FlightInfoStatusResult", {})
         except Exception as e:
             print(f"Error getting flight details: {e}")
             return None
 
-    def process_flight(self, flight, airport_icao):
+    async def process_flight(self, flight, airport_icao):
         try:
             # Get detailed flight data
-            details = self.get_flight_details(flight['ident'])
+            details = await self.get_flight_details(flight['ident'])
             if not details:
                 return None
 
+            scheduled_departure = details.get('filed_departuretime', 0)
+            scheduled_arrival = flight['estimatedarrivaltime']
+            actual_arrival = flight['actualarrivaltime']
+
             # Calculate en-route weather
-            departure_time = datetime.fromtimestamp(details.get('filed_departuretime', 0))
-            arrival_time = datetime.fromtimestamp(flight['actualarrivaltime'])
-            route_weather = self.get_route_weather(
+            route_weather = await self.get_route_weather(
                 details.get('origin'),
                 airport_icao,
-                departure_time + (arrival_time - departure_time) / 2
+                datetime.fromtimestamp((scheduled_departure + actual_arrival) / 2)
             )
 
+            # Walk the nested weather payload once; missing pieces fall back to defaults
+            current = (route_weather or {}).get('current') or {}
+            conditions = (current.get('weather') or [{}])[0]
+
             return {
                 "flight_number": flight['ident'],
                 "airline": flight.get('operator', 'Unknown'),
                 "origin": details.get('origin'),
                 "destination": airport_icao,
-                "scheduled_departure": departure_time,
-                "actual_departure": datetime.fromtimestamp(details.get('actualdeparturetime', 0)),
-                "scheduled_arrival": datetime.fromtimestamp(flight['estimatedarrivaltime']),
-                "actual_arrival": datetime.fromtimestamp(flight['actualarrivaltime']),
-                "delay_minutes": (flight['actualarrivaltime'] - flight['estimatedarrivaltime']) / 60,
+                "scheduled_departure_ts": scheduled_departure,
+                "actual_departure_ts": details.get('actualdeparturetime', 0),
+                "scheduled_arrival_ts": scheduled_arrival,
+                "actual_arrival_ts": actual_arrival,
+                "delay_minutes": (actual_arrival - scheduled_arrival) / 60,
                 "aircraft": flight.get('aircrafttype', 'Unknown'),
-                "route_weather": route_weather['current']['weather'][0]['main'] if route_weather else 'Unknown',
-                "route_weather_desc": route_weather['current']['weather'][0][
-                    'description'] if route_weather else 'Unknown',
-                "route_temp": route_weather['current']['temp'] if route_weather else None,
-                "route_wind": route_weather['current']['wind_speed'] if route_weather else None
+                "route_weather": conditions.get('main', 'Unknown'),
+                "route_weather_desc": conditions.get('description', 'Unknown'),
+                "route_temp": current.get('temp'),
+                "route_wind": current.get('wind_speed')
             }
         except Exception as e:
             print(f"Error processing flight {flight.get('ident')}: {e}")
             return None
 
-    def collect_data(self, hours=24, filename="flight_data_enhanced.xlsx"):
-        all_flights = []
-
-        for icao in INDIAN_AIRPORTS:
-            print(f"Processing {icao}...")
-            try:
-                # Get airport board
-                response = requests.get(
-                    f"{self.flightaware_base}AirportBoards",
-                    params={
-                        "airport": icao,
-                        "howMany": 10,
-                        "startTime": int((datetime.now() - timedelta(hours=hours)).timestamp()),
-                        "endTime": int(datetime.now().timestamp())
-                    },
-                    headers=self.flightaware_headers
-                )
-                flights = response.json().get("AirportBoardsResult", {}).get("arrivals", {}).get("flights", [])
-
-                # Process each flight
-                for flight in flights:
-                    processed = self.process_flight(flight, icao)
-                    if processed:
-                        all_flights.append(processed)
-
-                time.sleep(2)  # Rate limiting
-            except Exception as e:
-                print(f"Error processing airport {icao}: {e}")
-                continue
-
-        # Save to Excel
-        df = pd.DataFrame(all_flights)
-        df.to_excel(filename, index=False)
-        print(f"Data saved to {filename}")
-        return df
\ No newline at end of file
+    async def get_airport_flights(self, icao, start_ts, end_ts):
+        """Get the arrivals board for one airport"""
+        print(f"Processing {icao}...")
+        try:
+            data = await self._get_json(
+                self.flightaware_session,
+                f"{self.flightaware_base}AirportBoards",
+                self.flightaware_bp,
+                params={**self._BOARDS_PARAMS, "airport": icao, "startTime": start_ts, "endTime": end_ts}
+            )
+            board = (data.get("AirportBoardsResult") or {}).get("arrivals") or {}
+            flights = board.get("flights") or []
+            if not flights:
+                print(f"No arrivals at {icao}, skipping")
+            return flights
+        except Exception as e:
+            print(f"Error processing airport {icao}: {e}")
+            return []
+
+    async def iter_flights(self, hours):
+        """Yield processed flight records as soon as each one completes"""
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.limiter = AsyncLimiter(self.rps, 1)  # Rate limiting: rps requests per second
+        self.flightaware_bp = BackpressureController("FlightAware", c_max=self.concurrency)
+        self.weather_bp = BackpressureController("OpenWeatherMap", c_max=self.concurrency)
+        self.details_cache = OrderedDict()
+        self.weather_tasks = {}
+        with WeatherCache(self.weather_cache_path) as weather_cache:
+            self.weather_cache = weather_cache
+            # One pooled session per provider; FlightAware's API key is sent as a default header
+            async with self._new_session(self.flightaware_headers) as flightaware_session, \
+                    self._new_session() as weather_session:
+                self.flightaware_session = flightaware_session
+                self.weather_session = weather_session
+                try:
+                    # Fan out all airport boards first, then every flight across all airports at once
+                    now = datetime.now()
+                    start_ts = int((now - timedelta(hours=hours)).timestamp())
+                    end_ts = int(now.timestamp())
+                    boards = await asyncio.gather(*[self.get_airport_flights(icao, start_ts, end_ts)
+                                                    for icao in INDIAN_AIRPORTS])
+                    jobs = [self.process_flight(flight, icao)
+                            for icao, flights in zip(INDIAN_AIRPORTS, boards)
+                            for flight in flights]
+                    for job in asyncio.as_completed(jobs):
+                        processed = await job
+                        if processed:
+                            yield processed
+                finally:
+                    self.flightaware_session = None
+                    self.weather_session = None
+                    self.weather_cache = None
+
+    async def _write_parquet(self, hours, filename, chunk_size):
+        rows = 0
+        chunk = []
+        with pq.ParquetWriter(filename, FLIGHT_SCHEMA, compression="zstd") as writer:
+            async for processed in self.iter_flights(hours):
+                chunk.append(processed)
+                if len(chunk) >= chunk_size:
+                    writer.write_table(pa.Table.from_pylist(chunk, FLIGHT_SCHEMA))
+                    rows += len(chunk)
+                    chunk.clear()
+            if chunk:
+                writer.write_table(pa.Table.from_pylist(chunk, FLIGHT_SCHEMA))
+                rows += len(chunk)
+        return rows
+
+    def collect_data(self, hours=24, filename="flight_data_enhanced.parquet", chunk_size=1024):
+        """Stream processed flights to a Parquet file in row groups of chunk_size"""
+        rows = asyncio.run(self._write_parquet(hours, filename, chunk_size))
+        print(f"Saved {rows} flights to {filename}")
+        return filename
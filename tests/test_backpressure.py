@@ -0,0 +1,76 @@
+import asyncio
+import time
+import unittest
+
+from backpressure import BackpressureController
+
+
+class BackpressureControllerTest(unittest.TestCase):
+    def test_breaker_holds_back_queued_callers(self):
+        async def run():
+            controller = BackpressureController("test", c_init=1, breaker_threshold=1, cooldown=0.3)
+            sent_at = []
+
+            async def call(status):
+                async with controller:
+                    sent_at.append(time.monotonic())
+                    await asyncio.sleep(0.01)
+                    controller.record(0.01, status)
+
+            start = time.monotonic()
+            await asyncio.gather(call(429), *[call(200) for _ in range(4)])
+            return [t - start for t in sent_at]
+
+        offsets = asyncio.run(run())
+        self.assertLess(offsets[0], 0.1)
+        # Everything queued behind the 429 waits out the cooldown
+        self.assertTrue(all(offset >= 0.3 for offset in offsets[1:]), offsets)
+
+    def test_aimd_grows_and_shrinks(self):
+        async def run():
+            controller = BackpressureController("test", c_init=4)
+            for _ in range(4):
+                controller.record(0.1, 200)
+            grown = controller.c
+            controller.record(0.1, 503)
+            return grown, controller.c
+
+        grown, shrunk = asyncio.run(run())
+        self.assertEqual(grown, 6.0)
+        self.assertEqual(shrunk, 3.0)
+
+    def test_exhausted_quota_only_trips_on_the_reporting_response(self):
+        async def run():
+            controller = BackpressureController("test", cooldown=30)
+            controller.record(0.1, 200, {"x-ratelimit-remaining": "0"})
+            tripped = controller.open_until
+            controller.open_until = 0.0
+            controller.record(0.1, 200, {})
+            controller.record(0.1, None)
+            return tripped, controller.open_until
+
+        tripped, after = asyncio.run(run())
+        self.assertGreater(tripped, 0)
+        self.assertEqual(after, 0.0)
+
+    def test_sliding_window_is_bounded_and_throttles(self):
+        async def run():
+            controller = BackpressureController("test", rate_window=0.2, window_limit=2)
+            sent_at = []
+
+            async def call():
+                async with controller:
+                    sent_at.append(time.monotonic())
+
+            start = time.monotonic()
+            await asyncio.gather(*[call() for _ in range(3)])
+            return [t - start for t in sent_at], len(controller.sent)
+
+        offsets, window_size = asyncio.run(run())
+        self.assertTrue(all(offset < 0.1 for offset in offsets[:2]), offsets)
+        self.assertGreaterEqual(offsets[2], 0.2)
+        self.assertLessEqual(window_size, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
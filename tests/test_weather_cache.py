@@ -0,0 +1,41 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from weather_cache import WeatherCache
+
+
+class WeatherCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "weather.sqlite")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _stored_keys(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            return {row[0] for row in conn.execute("SELECT key FROM weather")}
+        finally:
+            conn.close()
+
+    def test_commits_in_batches_and_on_close(self):
+        with WeatherCache(self.path, commit_every=2) as cache:
+            cache.set("a", {"current": {"temp": 20}})
+            self.assertEqual(cache.get("a"), {"current": {"temp": 20}})
+            self.assertEqual(self._stored_keys(), set())
+            cache.set("b", {})
+            self.assertEqual(self._stored_keys(), {"a", "b"})
+            cache.set("c", {})
+        self.assertEqual(self._stored_keys(), {"a", "b", "c"})
+
+    def test_expired_entries_miss(self):
+        with WeatherCache(self.path, ttl=-1) as cache:
+            cache.set("a", {})
+            self.assertIsNone(cache.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+# weather_cache.py - On-disk cache for OpenWeatherMap responses
+import sqlite3
+import time
+import orjson
+
+
+class WeatherCache:
+    """SQLite-backed key/value cache with a per-entry TTL.
+
+    Historical weather never changes, so entries live for a week by default and
+    survive re-runs and crashes of the collector. Writes are committed in
+    batches of commit_every; use as a context manager so the tail is flushed.
+    """
+
+    def __init__(self, path="weather_cache.sqlite", ttl=3600 * 24 * 7, commit_every=64):
+        self.ttl = ttl
+        self.commit_every = commit_every
+        self.pending = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS weather "
+            "(key TEXT PRIMARY KEY, payload BLOB, fetched_at INTEGER)"
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get(self, key):
+        row = self.conn.execute(
+            "SELECT payload FROM weather WHERE key = ? AND fetched_at >= ?",
+            (key, int(time.time()) - self.ttl)
+        ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def set(self, key, value):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO weather (key, payload, fetched_at) VALUES (?, ?, ?)",
+            (key, orjson.dumps(value), int(time.time()))
+        )
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.flush()
+
+    def flush(self):
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()